@@ -1,13 +1,107 @@
 """command doit graph - inspect the task dependency graph"""
 
-from collections import deque, defaultdict
+from collections import deque, defaultdict, namedtuple
 from itertools import chain
+import io
 import json
+from operator import attrgetter
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+from .exceptions import InvalidCommand
 from .cmd_base import DoitCmdBase
 from .control import TaskControl
 
 
+# description of a node in the graph, dependencies are sorted lists of names
+GraphEntry = namedtuple('GraphEntry', 'name task_dep setup calc_dep')
+
+
+def _json_dumps(obj, pretty=False):
+    """serialise `obj` to a JSON string, compact unless `pretty`"""
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        return orjson.dumps(obj, option=option).decode()
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+def _reachable(seeds, get_deps):
+    """Breadth-first search from `seeds`, only reachable nodes are visited.
+
+    @param seeds: (list - str) start nodes
+    @param get_deps: callable(name) returning iterable of dependency names,
+                     or None if `name` is not a node of the graph
+    @return (set - str) reachable nodes
+    """
+    reached = set()
+    enqueued = set()
+    queue = deque()
+    append, popleft = queue.append, queue.popleft
+    for name in seeds:
+        if name not in enqueued:
+            enqueued.add(name)
+            append(name)
+    while queue:
+        name = popleft()
+        deps = get_deps(name)
+        if deps is None:
+            continue
+        reached.add(name)
+        for dep in deps:
+            if dep not in enqueued:
+                enqueued.add(dep)
+                append(dep)
+    return reached
+
+
+def _varint(value):
+    """encode non-negative int as unsigned LEB128 varint"""
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return out
+
+
+def _write_binary(stream, names, num_nodes, edge_lists):
+    """Write graph in compact binary format.
+
+    Layout (all integers are unsigned LEB128 varints):
+      - magic `DGRF` followed by version byte `1`
+      - number of names, number of nodes
+      - names table: length of utf-8 encoded name + bytes.
+        The first `num_nodes` names are the graph nodes (in output order),
+        other names are only referenced as dependencies.
+      - for each dependency type (task_dep, setup, calc_dep), for each node:
+        number of deps followed by sorted name indices delta-encoded
+        (first index is absolute, others are difference to previous).
+
+    @param edge_lists: (list - list - list - int) per dependency type,
+                       per node, indices of dependencies
+    """
+    buf = bytearray(b'DGRF\x01')
+    buf += _varint(len(names))
+    buf += _varint(num_nodes)
+    for name in names:
+        encoded = name.encode('utf-8')
+        buf += _varint(len(encoded))
+        buf += encoded
+    for node_deps in edge_lists:
+        for deps in node_deps:
+            buf += _varint(len(deps))
+            previous = 0
+            for idx in sorted(deps):
+                buf += _varint(idx - previous)
+                previous = idx
+    stream.write(bytes(buf))
+
+
 opt_output_format = {
     'name': 'output',
     'short': '',
@@ -17,11 +111,21 @@ opt_output_format = {
     'choices': [
         ('text', 'human-readable output'),
         ('json', 'machine-readable JSON'),
+        ('binary', 'compact binary format (varint encoded edge lists)'),
     ],
     'help': ("choose output format when inspecting the task graph. "
              "[default: %(default)s]"),
 }
 
+opt_pretty = {
+    'name': 'pretty',
+    'short': '',
+    'long': 'pretty',
+    'type': bool,
+    'default': False,
+    'help': "indent JSON output (default is compact)",
+}
+
 
 class Graph(DoitCmdBase):
     """Inspect task relationships without executing actions."""
@@ -33,7 +137,7 @@ class Graph(DoitCmdBase):
     )
     execute_tasks = True
 
-    cmd_options = (opt_output_format,)
+    cmd_options = (opt_output_format, opt_pretty)
 
     DEPENDENCY_TYPES = [
         ('task_dep', 'task_dep'),
@@ -41,75 +145,97 @@ class Graph(DoitCmdBase):
         ('calc_dep', 'calc_dep'),
     ]
 
-    def _execute(self, output='text', pos_args=None):
-        control = TaskControl(self.task_list)
-        control.process(self.sel_tasks)
-
-        self._pending_lazy = self._prepare_lazy_materialisation(control)
-        nodes = self._collect_nodes(control)
-        graph_entries = self._describe_graph(control, nodes)
+    def _execute(self, output='text', pretty=False, pos_args=None):
+        if self.task_list or self.sel_tasks:
+            graph_entries = self._get_graph_entries()
+        else:
+            # nothing to inspect, skip TaskControl
+            graph_entries = ()
 
         if output == 'json':
-            json.dump(graph_entries, self.outstream, indent=2)
-            self.outstream.write('\n')
+            self._print_json(graph_entries, pretty)
+        elif output == 'binary':
+            self._print_binary(graph_entries)
         else:
             self._print_text(graph_entries)
         return 0
 
+    def _get_graph_entries(self):
+        """Return iterable of GraphEntry for the selected tasks."""
+        control = TaskControl(self.task_list)
+        control.process(self.sel_tasks)
+
+        if self.sel_tasks is None:
+            # no selection, all tasks are part of the graph
+            nodes = set(control.tasks)
+        else:
+            self._pending_lazy, self._pending_by_name = (
+                self._prepare_lazy_materialisation(control))
+            nodes = self._collect_nodes(control)
+        return self._iter_graph_entries(control, nodes)
+
     def _prepare_lazy_materialisation(self, control):
         """Strip generator-produced subtasks for lazy re-insertion later.
         
         Subtasks are removed from control.tasks and stored in a pending dict
         keyed by their parent task name, so they can be materialized on-demand
         when first referenced.
+
+        @return (tuple) pending: parent name -> {subtask name -> Task}
+                        by_name: subtask name -> parent name
         """
         pending = defaultdict(dict)
-        for name, task in list(control.tasks.items()):
-            if getattr(task, 'subtask_of', None):
-                control.tasks.pop(name)
-                pending[task.subtask_of][name] = task
-        return pending
+        by_name = {}
+        sub_names = [name for name, task in control.tasks.items()
+                     if getattr(task, 'subtask_of', None)]
+        for name in sub_names:
+            task = control.tasks.pop(name)
+            pending[task.subtask_of][name] = task
+            by_name[name] = task.subtask_of
+        return pending, by_name
 
     def _collect_nodes(self, control):
         """Return set of task names reachable from the selected tasks.
-        
+
         Performs a breadth-first search starting from selected tasks,
         following task_dep and setup_tasks dependencies and materializing
         subtasks on-demand.
         """
         selected = control.selected_tasks or []
-        visited = set()
-        processed = set()
-        queue = deque(selected)
-
-        while queue:
-            name = queue.popleft()
-            if name in visited:
-                continue
+        # fast path: selected tasks have no dependencies, no need for BFS
+        tasks = control.tasks
+        for name in selected:
+            task = tasks.get(name)
+            if task is None or task.task_dep or task.setup_tasks:
+                break
+        else:
+            return set(selected)
 
-            visited.add(name)
-            task = control.tasks.get(name)
+        def get_deps(name):
+            task = tasks.get(name)
             if task is None:
                 self._lazy_materialise(control, name)
-                task = control.tasks.get(name)
+                task = tasks.get(name)
+                if task is None:
+                    return None
+            return self._get_all_dependencies(task)
 
-            if task is None:
-                continue
-
-            processed.add(name)
-            for dep in self._get_all_dependencies(task):
-                if dep not in visited:
-                    queue.append(dep)
-        return processed
+        return _reachable(selected, get_deps)
 
     @staticmethod
     def _get_all_dependencies(task):
         """Return all dependencies for a task.
-        
-        Returns an iterator over all dependencies without creating
-        intermediate lists for better memory efficiency.
+
+        Returns an iterable over all dependencies without creating
+        intermediate lists. If one of the lists is empty the other
+        list is returned directly (common for leaf tasks).
         """
-        return chain(task.task_dep, task.setup_tasks)
+        task_dep, setup_tasks = task.task_dep, task.setup_tasks
+        if not setup_tasks:
+            return task_dep
+        if not task_dep:
+            return setup_tasks
+        return chain(task_dep, setup_tasks)
 
     @staticmethod
     def _ordered_names(control, nodes):
@@ -118,61 +244,101 @@ class Graph(DoitCmdBase):
         Tasks are ordered by their definition order, with any remaining
         nodes (not in definition order) appended in sorted order.
         """
-        ordered = [name for name in control._def_order if name in nodes]
-        remaining = nodes - set(ordered)
+        remaining = set(nodes)
+        ordered = []
+        for name in control._def_order:
+            if name in remaining:
+                ordered.append(name)
+                remaining.discard(name)
         if remaining:
             ordered.extend(sorted(remaining))
         return ordered
 
-    def _describe_graph(self, control, nodes):
-        """Build serialisable representation of the graph."""
-        graph_entries = []
+    def _iter_graph_entries(self, control, nodes):
+        """Yield a GraphEntry for each node in the graph."""
         for name in self._ordered_names(control, nodes):
             task = control.tasks.get(name)
             if task is None:
                 continue
-            entry = {
-                'name': name,
-                'task_dep': sorted(task.task_dep),
-                'setup': sorted(task.setup_tasks),
-                'calc_dep': sorted(task.calc_dep),
-            }
-            graph_entries.append(entry)
-        return graph_entries
+            yield GraphEntry(
+                name=name,
+                task_dep=sorted(task.task_dep),
+                setup=sorted(task.setup_tasks),
+                calc_dep=sorted(task.calc_dep),
+            )
+
+    def _print_json(self, graph_entries, pretty=False):
+        """Print graph entries as a JSON array, encoded in a single pass."""
+        data = [entry._asdict() for entry in graph_entries]
+        self.outstream.write(_json_dumps(data, pretty) + '\n')
+
+    def _print_binary(self, graph_entries):
+        """Write graph entries in compact binary format, see _write_binary.
+
+        Bytes are written to the underlying binary buffer of outstream
+        when available (i.e. sys.stdout).
+        """
+        stream = getattr(self.outstream, 'buffer', None)
+        if stream is None:
+            if isinstance(self.outstream, io.TextIOBase):
+                msg = ("Output format 'binary' requires a binary output "
+                       "stream, can not write bytes to a text stream.")
+                raise InvalidCommand(msg)
+            stream = self.outstream
+        else:
+            self.outstream.flush()
+
+        entries = list(graph_entries)
+        names = [entry.name for entry in entries]
+        name_to_idx = {name: idx for idx, name in enumerate(names)}
+        edge_lists = []
+        for _, key in self.DEPENDENCY_TYPES:
+            node_deps = []
+            for entry in entries:
+                deps = []
+                for dep in getattr(entry, key):
+                    idx = name_to_idx.get(dep)
+                    if idx is None:
+                        idx = name_to_idx[dep] = len(names)
+                        names.append(dep)
+                    deps.append(idx)
+                node_deps.append(deps)
+            edge_lists.append(node_deps)
+        _write_binary(stream, names, len(entries), edge_lists)
 
     def _print_text(self, graph_entries):
-        """Pretty print graph entries in human-readable format."""
-        for entry in graph_entries:
-            self.outstream.write(f"{entry['name']}\n")
+        """Pretty print graph entries in human-readable format.
 
-            has_dependencies = False
-            for label, key in self.DEPENDENCY_TYPES:
-                values = entry.get(key, [])
+        Output is assembled as one string per entry and written with
+        a single call to outstream.write().
+        """
+        # resolve labels/getters once, not on every entry
+        getters = [(label, attrgetter(key))
+                   for label, key in self.DEPENDENCY_TYPES]
+        blocks = []
+        for entry in graph_entries:
+            lines = [f"{entry.name}\n"]
+            for label, getter in getters:
+                values = getter(entry)
                 if values:
-                    deps = ', '.join(values)
-                    self.outstream.write(f"  {label}: {deps}\n")
-                    has_dependencies = True
+                    lines.append(f"  {label}: {', '.join(values)}\n")
 
-            if not has_dependencies:
-                self.outstream.write("  (no dependencies)\n")
-            self.outstream.write("\n")
+            if len(lines) == 1:
+                lines.append("  (no dependencies)\n")
+            lines.append("\n")
+            blocks.append("".join(lines))
+        self.outstream.write("".join(blocks))
 
     def _lazy_materialise(self, control, name):
-        """Reinsert pending subtasks when first referenced by name. 
-        
-        When a task name is referenced, this method checks if there are 
-        pending subtasks that should be materialized.
+        """Reinsert pending subtasks when first referenced by name.
+
+        When a subtask name is referenced, all pending subtasks of its
+        parent are materialized together.
         """
         pending = self._pending_lazy
         if not pending:
             return
 
-        basename = name.split(':', 1)[0]
-        if basename in pending:
-            control.tasks.update(pending.pop(basename))
-            return
-
-        for _, tasks in pending.items():
-            if name in tasks:
-                control.tasks.update(tasks)
-                return
+        parent = self._pending_by_name.get(name)
+        if parent in pending:
+            control.tasks.update(pending.pop(parent))
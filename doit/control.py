@@ -203,7 +203,7 @@ class TaskControl(object):
                 continue
 
             # if can not find name check if it is a sub-task of a delayed
-            basename = filter_.split(':', 1)[0]
+            basename = filter_.partition(':')[0]
             if basename in self.tasks:
                 loader = self.tasks[basename].loader
                 if not loader:
@@ -1,8 +1,13 @@
-from io import StringIO
+from io import StringIO, BytesIO
 import json
+import sys
 
+import pytest
+
+from doit import cmd_graph as graph_mod
 from doit.cmd_graph import Graph
 from doit.control import TaskControl
+from doit.exceptions import InvalidCommand
 from doit.task import Task
 from tests.conftest import tasks_sample, CmdFactory
 
@@ -37,6 +42,103 @@ class TestCmdGraph:
         assert g1_entry['task_dep'] == ['g1.a', 'g1.b']
         assert g1_entry['setup'] == []
 
+    def test_json_output_without_orjson(self, monkeypatch):
+        def get_tasks():
+            tasks = tasks_sample()
+            tasks.append(Task('t\u00e2che', [''], task_dep=['t1']))
+            return tasks
+        orjson_output = StringIO()
+        cmd = CmdFactory(Graph, outstream=orjson_output, task_list=get_tasks())
+        cmd._execute(output='json')
+
+        monkeypatch.setattr(graph_mod, 'orjson', None)
+        output = StringIO()
+        cmd = CmdFactory(Graph, outstream=output, task_list=get_tasks())
+
+        cmd._execute(output='json')
+
+        data = json.loads(output.getvalue())
+        g1_entry = next(item for item in data if item['name'] == 'g1')
+        assert g1_entry['task_dep'] == ['g1.a', 'g1.b']
+        # non-ASCII is not escaped, output is the same as with orjson
+        assert '"t\u00e2che"' in output.getvalue()
+        assert output.getvalue() == orjson_output.getvalue()
+
+    def test_json_output_compact_by_default(self):
+        output = StringIO()
+        tasks = tasks_sample()
+        cmd = CmdFactory(Graph, outstream=output, task_list=tasks)
+
+        cmd._execute(output='json')
+
+        text = output.getvalue()
+        assert ' ' not in text
+        assert text.count('\n') == 1
+        assert len(json.loads(text)) == len(tasks)
+
+    def test_json_output_pretty(self):
+        output = StringIO()
+        tasks = tasks_sample()
+        cmd = CmdFactory(Graph, outstream=output, task_list=tasks)
+
+        cmd._execute(output='json', pretty=True)
+
+        text = output.getvalue()
+        assert '\n    "name": "g1"' in text
+        assert len(json.loads(text)) == len(tasks)
+
+    def test_binary_output_text_stream(self):
+        output = StringIO()
+        cmd = CmdFactory(Graph, outstream=output, task_list=[Task("t1", [""])])
+        with pytest.raises(InvalidCommand) as exc_info:
+            cmd._execute(output='binary')
+        assert 'binary' in str(exc_info.value)
+        assert output.getvalue() == ''
+
+    def test_binary_output(self):
+        def read_varint(buf, pos):
+            value = shift = 0
+            while True:
+                byte = buf[pos]
+                pos += 1
+                value |= (byte & 0x7f) << shift
+                shift += 7
+                if not byte & 0x80:
+                    return value, pos
+
+        output = BytesIO()
+        dep = Task("dep", [""])
+        main = Task("main", [""], task_dep=['b', 'a'], calc_dep=['dep'])
+        tasks = [dep, Task("a", [""]), Task("b", [""]), main]
+        cmd = CmdFactory(Graph, outstream=output, task_list=tasks,
+                         sel_tasks=['main'])
+
+        cmd._execute(output='binary')
+
+        buf = output.getvalue()
+        assert buf[:5] == b'DGRF\x01'
+        pos = 5
+        num_names, pos = read_varint(buf, pos)
+        num_nodes, pos = read_varint(buf, pos)
+        names = []
+        for _ in range(num_names):
+            size, pos = read_varint(buf, pos)
+            names.append(buf[pos:pos+size].decode('utf-8'))
+            pos += size
+        assert num_nodes == 3
+        assert names == ['a', 'b', 'main', 'dep']
+        edges = []
+        for _ in range(3):  # task_dep, setup, calc_dep
+            for node in names[:num_nodes]:
+                count, pos = read_varint(buf, pos)
+                idx = 0
+                for _ in range(count):
+                    delta, pos = read_varint(buf, pos)
+                    idx += delta
+                    edges.append(names[idx])
+        assert edges == ['a', 'b', 'dep']
+        assert pos == len(buf)
+
     def test_selection_limits_graph(self):
         output = StringIO()
         s3 = Task("s3", None)
@@ -68,6 +170,16 @@ class TestCmdGraph:
         d2_entry = next(e for e in data if e['name'] == 'd2')
         assert d2_entry['setup'] == ['s3']
 
+    def test_no_selection_includes_all_tasks(self):
+        output = StringIO()
+        tasks = tasks_sample()
+        cmd_graph = CmdFactory(Graph, outstream=output, task_list=tasks)
+
+        cmd_graph._execute(output='json')
+
+        data = json.loads(output.getvalue())
+        assert [e['name'] for e in data] == [t.name for t in tasks]
+
     def test_actions_are_not_executed(self):
         output = StringIO()
         marker = []
@@ -100,9 +212,8 @@ class TestCmdGraphEdgeCases:
     def test_subtask_with_colon_separator(self):
         """Test lazy materialization with standard colon separator (production case).
 
-        The _lazy_materialise method has an optimization path for ':' separator
-        but tests/conftest.py uses '.' separator. This test verifies the colon
-        separator path works correctly.
+        tests/conftest.py uses '.' separator. This test verifies subtasks
+        named with the colon separator are materialized correctly.
         """
         output = StringIO()
         parent = Task("group", None, has_subtask=True, task_dep=['group:sub1', 'group:sub2'])
@@ -175,11 +286,52 @@ class TestCmdGraphEdgeCases:
         t3_entry = next(e for e in data if e['name'] == 't3')
         assert t3_entry['task_dep'] == ['t1']
 
+    def test_long_dependency_chain(self):
+        """Ordering and traversal are iterative and linear.
+
+        A chain deeper than the recursion limit must not fail, and nodes
+        are listed in definition order.
+        """
+        size = sys.getrecursionlimit() + 100
+        tasks = [Task("t0", [""])]
+        for i in range(1, size):
+            tasks.append(Task(f"t{i}", [""], task_dep=[f"t{i-1}"]))
+
+        output = StringIO()
+        cmd_graph = CmdFactory(Graph, outstream=output, task_list=tasks,
+                               sel_tasks=[f"t{size-1}"])
+        cmd_graph._execute(output='json')
+
+        data = json.loads(output.getvalue())
+        assert [entry['name'] for entry in data] == [t.name for t in tasks]
+
+    def test_diamond_dependency_listed_once(self):
+        output = StringIO()
+        base = Task("base", [""])
+        left = Task("left", [""], task_dep=['base'])
+        right = Task("right", [""], setup=['base'])
+        top = Task("top", [""], task_dep=['left', 'right'], setup=['base'])
+        tasks = [base, left, right, top]
+
+        cmd_graph = CmdFactory(Graph, outstream=output, task_list=tasks,
+                               sel_tasks=['top', 'top'])
+        cmd_graph._execute(output='json')
+
+        data = json.loads(output.getvalue())
+        assert [e['name'] for e in data] == ['base', 'left', 'right', 'top']
+
+    def test_reachable_shared_deps_and_cycle(self):
+        # 'x' is not a node, 'e' is not reachable
+        graph = {'a': ['b', 'c'], 'b': ['d'], 'c': ['d', 'x'], 'd': ['a'],
+                 'e': ['a']}
+        reached = graph_mod._reachable(['b', 'b'], graph.get)
+        assert reached == {'a', 'b', 'c', 'd'}
+
     def test_subtask_referenced_before_parent(self):
         """Test when a subtask is referenced directly before its parent.
 
-        This tests the fallback path in _lazy_materialise where we search
-        through pending subtasks by name rather than by parent basename.
+        The subtask is resolved to its parent through the pending
+        subtask index, not through the parent being visited first.
         """
         output = StringIO()
         parent = Task("parent", None, has_subtask=True, task_dep=['parent:child'])
@@ -226,7 +378,7 @@ class TestCmdGraphEdgeCases:
         """Test subtask names with multiple colons (multi-level generators).
 
         doit supports multi-level generators which produce names like 'xpto:0-0'.
-        The split(':', 1)[0] should correctly extract the basename.
+        The parent must be found regardless of the number of colons.
         """
         output = StringIO()
         parent = Task("xpto", None, has_subtask=True, task_dep=['xpto:level1:level2'])
@@ -263,6 +415,21 @@ class TestCmdGraphEdgeCases:
         assert setup_entry['setup'] == []
         assert setup_entry['task_dep'] == []
 
+    def test_selected_leaf_tasks(self):
+        """Selected tasks without dependencies, dependents are not included."""
+        output = StringIO()
+        t1 = Task("t1", [""])
+        t2 = Task("t2", [""], calc_dep=['t1'])
+        t3 = Task("t3", [""], task_dep=['t1'])
+        tasks = [t1, t2, t3]
+
+        cmd = CmdFactory(Graph, outstream=output, task_list=tasks,
+                         sel_tasks=['t2', 't1'])
+        cmd._execute(output='json')
+
+        data = json.loads(output.getvalue())
+        assert [entry['name'] for entry in data] == ['t1', 't2']
+
     def test_empty_task_list(self):
         """Test behavior with empty task list."""
         output = StringIO()
@@ -275,6 +442,16 @@ class TestCmdGraphEdgeCases:
         data = json.loads(output.getvalue())
         assert data == []
 
+    def test_empty_task_list_text(self):
+        """Empty task list, nothing is printed."""
+        output = StringIO()
+
+        cmd = CmdFactory(Graph, outstream=output, task_list=[])
+        result = cmd._execute()
+
+        assert result == 0
+        assert output.getvalue() == ""
+
     def test_calc_dep_not_traversed_but_displayed(self):
         """Test that calc_dep is displayed but not traversed.
 